@@ -1,17 +1,25 @@
 import argparse
-from issues import get_google_code_issues
+import sys
+from issues import add_project_arguments, get_google_code_issues
 
-parser = argparse.ArgumentParser(description='Get labels')
-parser.add_argument('project')
-parser.add_argument('-n', '--limit', dest='limit', type=int, default=-1)
-parser.add_argument('-s', '--start', dest='start', type=int, default=1)
-args = parser.parse_args()
 
-LABELS = set()
+def get_labels(project, start=1, limit=-1):
+    labels = set()
+    for issue in get_google_code_issues(project, start, limit):
+        labels.update(issue.labels)
+    return sorted(labels)
 
-for issue in get_google_code_issues(args.project, args.start, args.limit):
-    for label in issue.labels:
-        LABELS.add(label)
 
+def add_arguments(parser):
+    add_project_arguments(parser)
 
-print '\n'.join(sorted(LABELS))
+
+def run(args):
+    print '\n'.join(get_labels(args.project, args.start, args.limit))
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Get labels')
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))
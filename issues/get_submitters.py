@@ -1,28 +1,57 @@
 import argparse
-from issues import get_google_code_issues
+import sys
+from issues import (add_project_arguments, get_google_code_issues,
+                    SubmitterMapper)
 
-parser = argparse.ArgumentParser(description='Get issue submitters, commenters '
-                                 'and owners from Google Code in TSV format.')
-parser.add_argument('project')
-parser.add_argument('-n', '--limit', dest='limit', type=int, default=-1)
-parser.add_argument('-s', '--start', dest='start', type=int, default=1)
-args = parser.parse_args()
 
-SUBMITTERS = {}
+def get_submitters(project, start=1, limit=-1):
+    submitters = {}
 
-def add(user, id):
-    if user:
-        SUBMITTERS.setdefault(user, set()).add(id)
+    def add(user, id):
+        if user:
+            submitters.setdefault(user, set()).add(id)
 
+    for issue in get_google_code_issues(project, start, limit):
+        add(issue.owner, issue.id)
+        add(issue.description.user, issue.id)
+        for comment in issue.comments:
+            add(comment.user, issue.id)
+    return submitters
 
-for issue in get_google_code_issues(args.project, args.start, args.limit):
-    add(issue.owner, issue.id)
-    add(issue.description.user, issue.id)
-    for comment in issue.comments:
-        add(comment.user, issue.id)
 
+def print_submitters(submitters):
+    print '# User\tIssues'
+    for user in sorted(submitters):
+        issues = sorted(submitters[user])
+        print user, '\t', ', '.join(str(id) for id in issues)
 
-print '# User\tIssues'
-for user in sorted(SUBMITTERS):
-    issues = sorted(SUBMITTERS[user])
-    print user, '\t', ', '.join(str(id) for id in issues)
+
+def save_submitter_index(submitters, path, submitter_map=None):
+    mapper = SubmitterMapper(submitter_map)
+    for user in submitters:
+        mapper.add(user, mapper.map(user))
+    mapper.save_index(path)
+
+
+def add_arguments(parser):
+    add_project_arguments(parser)
+    parser.add_argument('-i', '--index', dest='index',
+                        help='also save submitters as a binary submitter map')
+    parser.add_argument('-m', '--submitter-map', dest='submitter_map',
+                        help='submitter map used with --index')
+
+
+def run(args):
+    submitters = get_submitters(args.project, args.start, args.limit)
+    print_submitters(submitters)
+    if args.index:
+        save_submitter_index(submitters, args.index, args.submitter_map)
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Get issue submitters, '
+                                     'commenters and owners from Google Code '
+                                     'in TSV format.')
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))
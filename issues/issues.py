@@ -1,15 +1,17 @@
+"""Migrate issues from Google Code to GitHub.
+
+Heavy dependencies (`github3`, `bs4`, `urllib2` and `csv`) are imported only
+by the functions that need them to keep startup fast for other tasks.
+"""
+
 import argparse
 import getpass
-import csv
-import urllib2
+import marshal
 import re
 import sys
 import time
 from datetime import datetime, timedelta
 
-from bs4 import BeautifulSoup
-import github3
-
 
 GOOGLE_CODE_ISSUES = (
     'http://code.google.com/p/{project}/issues/csv?start={start}&num={num}'
@@ -50,6 +52,8 @@ class Issue(object):
         return ''
 
     def _get_issue_details(self, project, id_):
+        import urllib2
+        from bs4 import BeautifulSoup
         opener = urllib2.build_opener()
         url = ISSUE_URL.format(project=project, id=id_)
         try:
@@ -130,10 +134,126 @@ class DeletedIssue(object):
         self.id = id
 
 
+class DeletedIssueImporter(object):
+    """Creates placeholders for ranges of deleted issues.
+
+    Uses GitHub's issue import API that creates an already closed issue with
+    one request. Falls back to `insert_issue` if the API is not available.
+    """
+    _accept = 'application/vnd.github.golden-comet-preview+json'
+    _chunk_size = 100
+    _max_polls = 60
+    _poll_interval = 1
+
+    def __init__(self, gh, repo):
+        self._gh = gh
+        self._repo = repo
+        self._import_api = True
+        self._imported = False
+        self.created = 0
+        self.elapsed = 0.0
+
+    def fill(self, first, last):
+        start = time.time()
+        for chunk_start in range(first, last + 1, self._chunk_size):
+            chunk_end = min(chunk_start + self._chunk_size - 1, last)
+            needed = self._api_calls_needed(chunk_start, chunk_end)
+            ensure_api_calls_left(self._gh, needed)
+            self._fill_chunk(chunk_start, chunk_end)
+        self.created += last - first + 1
+        self.elapsed += time.time() - start
+        debug('Created deleted issues {first}-{last}'.format(first=first,
+                                                              last=last))
+
+    def _api_calls_needed(self, first, last):
+        count = last - first + 1
+        if self._imported:
+            return count + self._max_polls + 50
+        # Fallback may be needed and insert_issue uses two calls per issue.
+        return 2 * count + self._max_polls + 50
+
+    def _fill_chunk(self, first, last):
+        pending = None
+        for id in range(first, last + 1):
+            if self._import_api:
+                status_url = self._import(DeletedIssue(id))
+                if status_url:
+                    pending = status_url, id
+                    continue
+            if pending:
+                self._wait_until_imported(*pending)
+                pending = None
+            insert_issue(self._repo, DeletedIssue(id))
+        if pending:
+            self._wait_until_imported(*pending)
+
+    def _import(self, issue):
+        import github3
+        url = self._repo._build_url('import', 'issues',
+                                    base_url=self._repo._api)
+        payload = {'issue': {'title': issue.summary, 'closed': True,
+                             'body': unicode(issue.description)}}
+        try:
+            response = self._repo._post(url, data=payload,
+                                        headers={'Accept': self._accept})
+            json = self._repo._json(response, 202)
+        except github3.models.GitHubError as err:
+            if self._imported:
+                raise
+            error('Using issue import API failed: %s' % err)
+            json = None
+        if not json:
+            error('Issue import API not available, creating deleted issues '
+                  'one by one.')
+            self._import_api = False
+            return None
+        self._imported = True
+        return json['url']
+
+    def _wait_until_imported(self, status_url, id):
+        for _ in range(self._max_polls):
+            response = self._repo._get(status_url,
+                                       headers={'Accept': self._accept})
+            status = self._repo._json(response, 200)
+            if not status:
+                raise RuntimeError('Getting import status of deleted issue '
+                                   '%r from %s failed.' % (id, status_url))
+            if status['status'] != 'pending':
+                break
+            time.sleep(self._poll_interval)
+        else:
+            raise RuntimeError('Importing deleted issue %r did not finish in '
+                               '%d status checks.' % (id, self._max_polls))
+        assert status['status'] == 'imported', \
+            'Importing deleted issue %r failed: %r' % (id, status)
+        number = int(status['issue_url'].rsplit('/', 1)[1])
+        assert number == id, '%r != %r' % (number, id)
+
+    def report(self):
+        if self.created:
+            info('Created {count} deleted issues in {elapsed:.1f} seconds '
+                 '({rate:.1f} issues/second)'.format(
+                     count=self.created, elapsed=self.elapsed,
+                     rate=self.created / max(self.elapsed, 0.001)))
+
+
 class SubmitterMapper(object):
+    """Maps Google Code users to GitHub users.
 
-    def __init__(self, path=None):
+    The map is read from a TSV file with submitter and name as the first two
+    columns or from a binary index created with `save_index`. Users not in
+    the map are normalized by dropping the email domain. Normalized names are
+    cached and the cache is cleared when it has `cache_size` users. Caching
+    is disabled if `cache_size` is zero.
+    """
+    _index_header = 'SUBMITTER-INDEX-1\n'
+
+    def __init__(self, path=None, cache_size=10000):
         self._map = {}
+        self._cache = {}
+        self._cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
         if path:
             info('Reading submitter map %s' % path)
             self._read_map(path)
@@ -141,17 +261,60 @@ class SubmitterMapper(object):
             info('No submitter map')
 
     def _read_map(self, path):
-        with open(path) as map_file:
-            for row in map_file:
-                if not row or row.startswith('#'):
-                    continue
-                submitter, name = row.split('\t')[:2]
-                self._map[submitter] = name
+        with open(path, 'rb') as map_file:
+            content = map_file.read()
+        if content.startswith(self._index_header):
+            self._map = marshal.loads(content[len(self._index_header):])
+        else:
+            self._map = self._parse_map(content.splitlines(), path)
+
+    def _parse_map(self, rows, path):
+        submitters = {}
+        for lineno, row in enumerate(rows, start=1):
+            if not row.strip() or row.startswith('#'):
+                continue
+            cells = [cell.strip() for cell in row.split('\t', 2)]
+            if len(cells) < 2 or not all(cells[:2]):
+                error('Invalid row %d in submitter map %s: %r'
+                      % (lineno, path, row))
+                continue
+            submitter, name = cells[:2]
+            if submitters.get(submitter, name) != name:
+                error("Submitter '%s' mapped to both '%s' and '%s' in %s. "
+                      "Using '%s'." % (submitter, submitters[submitter], name,
+                                       path, submitters[submitter]))
+                continue
+            submitters[submitter] = name
+        return submitters
+
+    def save_index(self, path):
+        with open(path, 'wb') as index_file:
+            index_file.write(self._index_header)
+            marshal.dump(self._map, index_file)
+
+    def add(self, submitter, name):
+        self._map[submitter] = name
 
     def map(self, submitter):
         if submitter in self._map:
             return self._map[submitter]
-        return submitter.split('@')[0].split('%')[0].strip()
+        name = self._cache.get(submitter)
+        if name is not None:
+            self.hits += 1
+            return name
+        self.misses += 1
+        name = submitter.split('@')[0].split('%')[0].strip()
+        if self._cache_size > 0:
+            if len(self._cache) >= self._cache_size:
+                self._cache.clear()
+            self._cache[submitter] = name
+        return name
+
+    def report(self):
+        info('Submitter map: {mapped} mapped users, {hits} cache hits, '
+             '{misses} cache misses'.format(mapped=len(self._map),
+                                            hits=self.hits,
+                                            misses=self.misses))
 
 
 class DateFormatter(object):
@@ -205,17 +368,36 @@ def main(source_project, target_project, github_username, github_password,
     SUBMITTER_MAPPER = SubmitterMapper(submitter_map)
     gh, repo = access_github_repo(target_project, github_username, github_password)
     deleted, next_issue = _get_migrated_issue_numbers(repo)
-    for issue in get_google_code_issues(source_project, next_issue - deleted,
-                                        issue_limit):
+    rows = list(get_google_code_rows(source_project, next_issue - deleted,
+                                     issue_limit))
+    gaps = find_deleted_ranges([int(row[0]) for row in rows], next_issue)
+    info('{count} deleted issues in {ranges} ranges'.format(
+        count=sum(last - first + 1 for first, last in gaps.values()),
+        ranges=len(gaps)))
+    importer = DeletedIssueImporter(gh, repo)
+    for row in rows:
+        issue = Issue(source_project, *row[:7])
         ensure_api_calls_left(gh)
         debug('Processing issue:\n{issue}'.format(issue=issue))
         milestone = get_milestone(repo, issue)
-        while issue.id > next_issue:
-            insert_issue(repo, DeletedIssue(next_issue))
-            next_issue += 1
+        if issue.id in gaps:
+            importer.fill(*gaps[issue.id])
+            next_issue = issue.id
         assert issue.id == next_issue, '%r != %r' % (issue.id, next_issue)
         insert_issue(repo, issue, milestone)
         next_issue += 1
+    importer.report()
+    SUBMITTER_MAPPER.report()
+
+
+def find_deleted_ranges(ids, next_issue):
+    """Returns ranges of missing ids keyed by the id following the range."""
+    ranges = {}
+    for id in ids:
+        if id > next_issue:
+            ranges[id] = (next_issue, id - 1)
+        next_issue = id + 1
+    return ranges
 
 
 def _get_migrated_issue_numbers(repo):
@@ -226,6 +408,7 @@ def _get_migrated_issue_numbers(repo):
 
 
 def access_github_repo(target_project, username, password=None):
+    import github3
     if not password:
         prompt = 'GitHub password for {user}: '.format(user=username)
         password = getpass.getpass(prompt)
@@ -235,6 +418,13 @@ def access_github_repo(target_project, username, password=None):
 
 
 def get_google_code_issues(project, start=1, issue_limit=-1):
+    for row in get_google_code_rows(project, start, issue_limit):
+        yield Issue(project, *row[:7])
+
+
+def get_google_code_rows(project, start=1, issue_limit=-1):
+    import csv
+    import urllib2
     limit_issues = issue_limit > 0
     num = 100
     while True:
@@ -254,7 +444,7 @@ def get_google_code_issues(project, start=1, issue_limit=-1):
                 start += 100
                 paginated = True
             else:
-                yield Issue(project, *row[:7])
+                yield row
         if not paginated:
             return
 
@@ -269,8 +459,8 @@ def get_milestone(repo, issue):
     return repo.create_milestone(issue.target).number
 
 
-def ensure_api_calls_left(gh):
-    while gh.ratelimit_remaining < 50:
+def ensure_api_calls_left(gh, needed=50):
+    while gh.ratelimit_remaining < needed:
         debug('Not enough API calls left, sleeping one minute')
         time.sleep(60)
     debug('Remaining API calls: {}'.format(gh.ratelimit_remaining))
@@ -287,6 +477,7 @@ def info(msg):
 
 
 def insert_issue(repo, issue, milestone=None):
+    import github3
     github_issue = repo.create_issue(
         issue.summary, unicode(issue.description), labels=issue.labels,
         milestone=milestone)
@@ -307,16 +498,29 @@ def insert_issue(repo, issue, milestone=None):
                                               url=github_issue.html_url))
 
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(
-        description='Migrate issues from Google Code to GitHub')
+def add_arguments(parser):
     parser.add_argument('source_project')
     parser.add_argument('target_project')
     parser.add_argument('github_username')
     parser.add_argument('github_password', nargs='?', default=None)
     parser.add_argument('-l', '--limit', dest='limit', type=int, default=-1)
     parser.add_argument('-m', '--submitter-map', dest='submitter_map')
-    args = parser.parse_args()
 
+
+def add_project_arguments(parser):
+    parser.add_argument('project')
+    parser.add_argument('-n', '--limit', dest='limit', type=int, default=-1)
+    parser.add_argument('-s', '--start', dest='start', type=int, default=1)
+
+
+def run(args):
     main(args.source_project, args.target_project, args.github_username,
          args.github_password, args.limit, args.submitter_map)
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Migrate issues from Google Code to GitHub')
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,271 @@
+import json
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equals, assert_raises
+from github3.repos import Repository
+from github3.session import GitHubSession
+import issues
+from issues import DeletedIssueImporter, SubmitterMapper, find_deleted_ranges
+from get_submitters import save_submitter_index
+
+
+class TestFindDeletedRanges(object):
+
+    def test_no_gaps(self):
+        assert_equals(find_deleted_ranges([1, 2, 3], 1), {})
+
+    def test_gaps(self):
+        assert_equals(find_deleted_ranges([1, 2, 5, 6, 10], 1),
+                      {5: (3, 4), 10: (7, 9)})
+
+    def test_gap_before_first_issue(self):
+        assert_equals(find_deleted_ranges([3, 4], 1), {3: (1, 2)})
+
+    def test_start_from_next_issue(self):
+        assert_equals(find_deleted_ranges([7, 9], 7), {9: (8, 8)})
+
+
+REPO_URL = 'https://api.github.com/repos/o/r'
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.content = json.dumps(data)
+        self.headers = {}
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class FakeSession(GitHubSession):
+    """Responds to the requests github3 makes like GitHub would."""
+
+    def __init__(self, next_number, import_status=202, imports_before_404=None,
+                 pending_polls=0):
+        super(FakeSession, self).__init__()
+        self.auth = ('user', 'password')
+        self.next_number = next_number
+        self.import_status = import_status
+        self.imports_before_404 = imports_before_404
+        self.pending_polls = pending_polls
+        self.requests = []
+        self.imported = []
+        self.created = []
+        self.closed = []
+
+    def post(self, url, data=None, **kwargs):
+        self.requests.append(('POST', url))
+        if url == REPO_URL + '/import/issues':
+            assert json.loads(data)['issue']['closed']
+            return self._import()
+        number = self._next()
+        self.created.append(number)
+        return FakeResponse(201, self._issue(number))
+
+    def _import(self):
+        if self.import_status != 202:
+            return FakeResponse(self.import_status, {'message': 'Forbidden'})
+        if len(self.imported) == self.imports_before_404:
+            return FakeResponse(404, {'message': 'Not Found'})
+        number = self._next()
+        self.imported.append(number)
+        return FakeResponse(202, {'status': 'pending', 'url': '%s/import/'
+                                  'issues/%d' % (REPO_URL, number)})
+
+    def get(self, url, **kwargs):
+        self.requests.append(('GET', url))
+        if self.pending_polls:
+            self.pending_polls -= 1
+            return FakeResponse(200, {'status': 'pending'})
+        number = int(url.rsplit('/', 1)[1])
+        return FakeResponse(200, {'status': 'imported', 'issue_url':
+                                  '%s/issues/%d' % (REPO_URL, number)})
+
+    def patch(self, url, data=None, **kwargs):
+        number = int(url.rsplit('/', 1)[1])
+        self.closed.append(number)
+        return FakeResponse(200, self._issue(number, 'closed'))
+
+    def _next(self):
+        self.next_number += 1
+        return self.next_number - 1
+
+    def _issue(self, number, state='open'):
+        return {'number': number, 'state': state, 'labels': [], 'user': {},
+                'url': '%s/issues/%d' % (REPO_URL, number),
+                'html_url': 'https://github.com/o/r/issues/%d' % number}
+
+
+class FakeGitHub(object):
+
+    def __init__(self, *ratelimits):
+        self._ratelimits = list(ratelimits)
+
+    @property
+    def ratelimit_remaining(self):
+        if len(self._ratelimits) > 1:
+            return self._ratelimits.pop(0)
+        return self._ratelimits[0]
+
+
+class FakeTime(object):
+
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def time(self):
+        self.now += 1
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+class TestDeletedIssueImporter(object):
+
+    def setUp(self):
+        self.time = FakeTime()
+        self._orig_time = issues.time
+        issues.time = self.time
+
+    def tearDown(self):
+        issues.time = self._orig_time
+
+    def _fill(self, session, first, last, gh=None):
+        importer = DeletedIssueImporter(gh or FakeGitHub(5000),
+                                        Repository({'url': REPO_URL}, session))
+        importer.fill(first, last)
+        return importer
+
+    def test_import_api(self):
+        session = FakeSession(3)
+        importer = self._fill(session, 3, 5)
+        assert_equals(session.imported, [3, 4, 5])
+        assert_equals(session.created, [])
+        assert_equals(importer.created, 3)
+        assert importer.elapsed > 0
+
+    def test_ranges_are_filled_in_chunks(self):
+        session = FakeSession(1)
+        importer = self._fill(session, 1, 250)
+        assert_equals(session.imported, range(1, 251))
+        assert_equals([url for method, url in session.requests
+                       if method == 'GET'],
+                      ['%s/import/issues/%d' % (REPO_URL, n)
+                       for n in (100, 200, 250)])
+        assert_equals(importer.created, 250)
+
+    def test_fallback_when_import_api_is_refused(self):
+        for status in 403, 404, 415:
+            session = FakeSession(3, import_status=status)
+            importer = self._fill(session, 3, 5)
+            assert_equals(session.imported, [])
+            assert_equals(session.created, [3, 4, 5])
+            assert_equals(session.closed, [3, 4, 5])
+            assert_equals(importer.created, 3)
+
+    def test_queued_imports_are_waited_before_fallback(self):
+        session = FakeSession(3, imports_before_404=2)
+        self._fill(session, 3, 6)
+        assert_equals(session.imported, [3, 4])
+        assert_equals(session.created, [5, 6])
+        status_check = session.requests.index(
+            ('GET', REPO_URL + '/import/issues/4'))
+        first_create = session.requests.index(('POST', REPO_URL + '/issues'))
+        assert status_check < first_create
+
+    def test_status_is_polled_until_imported(self):
+        session = FakeSession(3, pending_polls=2)
+        self._fill(session, 3, 3)
+        assert_equals(self.time.sleeps, [1, 1])
+
+    def test_polling_is_bounded(self):
+        session = FakeSession(3, pending_polls=1000)
+        assert_raises(RuntimeError, self._fill, session, 3, 3)
+        assert_equals(len(self.time.sleeps), DeletedIssueImporter._max_polls)
+
+    def test_api_calls_are_reserved_for_fallback(self):
+        needed = 2 * 100 + DeletedIssueImporter._max_polls + 50
+        self._fill(FakeSession(1), 1, 100, FakeGitHub(needed))
+        assert_equals(self.time.sleeps, [])
+        self._fill(FakeSession(1), 1, 100, FakeGitHub(needed - 1, 5000))
+        assert_equals(self.time.sleeps, [60])
+
+
+class TestSubmitterMapper(object):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tempdir, name)
+        with open(path, 'w') as output:
+            output.write(content)
+        return path
+
+    def _mapper(self, content):
+        return SubmitterMapper(self._write('map.tsv', content))
+
+    def test_cells_are_stripped(self):
+        mapper = self._mapper('# User\tName\n  foo@x.org \t @foo \t extra\n')
+        assert_equals(mapper.map('foo@x.org'), '@foo')
+
+    def test_invalid_rows_are_ignored(self):
+        mapper = self._mapper('no tab\n\t@empty\nempty\t\n\nok@x\t@ok\n')
+        assert_equals(mapper._map, {'ok@x': '@ok'})
+
+    def test_first_of_conflicting_rows_wins(self):
+        mapper = self._mapper('foo@x\t@first\nfoo@x\t@second\n'
+                              'foo@x\t@first\n')
+        assert_equals(mapper.map('foo@x'), '@first')
+
+    def test_index_round_trip(self):
+        mapper = self._mapper('foo@x\t@foo\nbar@x\t@bar\n')
+        index = os.path.join(self.tempdir, 'map.index')
+        mapper.save_index(index)
+        assert_equals(SubmitterMapper(index)._map, mapper._map)
+
+    def test_save_submitter_index(self):
+        index = os.path.join(self.tempdir, 'map.index')
+        save_submitter_index({'foo@x': set([1]), 'bar@y.org': set([2])}, index,
+                             self._write('map.tsv', 'foo@x\t@foo\n'))
+        assert_equals(SubmitterMapper(index)._map,
+                      {'foo@x': '@foo', 'bar@y.org': 'bar'})
+
+    def test_unmapped_users_are_normalized(self):
+        mapper = SubmitterMapper()
+        assert_equals(mapper.map('some.one@gmail.com'), 'some.one')
+        assert_equals(mapper.map('other%x@y'), 'other')
+
+    def test_cache_hits_and_misses(self):
+        mapper = SubmitterMapper()
+        for user in ['a@x', 'b@x', 'a@x', 'a@x', 'c@x']:
+            mapper.map(user)
+        assert_equals((mapper.hits, mapper.misses), (2, 3))
+
+    def test_mapped_users_do_not_use_cache(self):
+        mapper = self._mapper('a@x\t@a\n')
+        mapper.map('a@x')
+        assert_equals((mapper.hits, mapper.misses), (0, 0))
+
+    def test_cache_is_cleared_when_full(self):
+        mapper = SubmitterMapper(cache_size=2)
+        for user in ['a@x', 'b@x', 'c@x', 'c@x', 'a@x']:
+            mapper.map(user)
+        assert_equals((mapper.hits, mapper.misses), (1, 4))
+        assert_equals(sorted(mapper._cache), ['a@x', 'c@x'])
+
+    def test_zero_cache_size_disables_caching(self):
+        mapper = SubmitterMapper(cache_size=0)
+        assert_equals(mapper.map('a@b'), 'a')
+        assert_equals(mapper.map('a@b'), 'a')
+        assert_equals((mapper.hits, mapper.misses), (0, 2))
@@ -0,0 +1,74 @@
+"""Measure startup time of migration-tools commands
+
+Usage: startup_time.py [rounds]
+
+Runs each `migration-tools` subcommand with `--help` `rounds` times (default
+10) and reports the fastest wall clock time. Additionally reports how long
+importing the modules used by each subcommand takes and which heavy
+dependencies get imported as a side effect.
+"""
+
+import os
+import subprocess
+import sys
+from timeit import default_timer as timer
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+COMMAND = os.path.join(ROOT, 'migration-tools')
+SUBCOMMANDS = [('issues migrate', 'issues'),
+               ('issues labels', 'get_labels'),
+               ('issues submitters', 'get_submitters'),
+               ('wiki convert', 'transformer')]
+HEAVY_MODULES = ['github3', 'bs4', 'urllib2', 'csv']
+IMPORT_SCRIPT = '''\
+import sys
+from timeit import default_timer as timer
+sys.path[:0] = %r
+start = timer()
+import %s
+elapsed = timer() - start
+print elapsed, ' '.join(m for m in %r if m in sys.modules) or '-'
+'''
+
+
+def measure(command, rounds):
+    best = None
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(rounds):
+            start = timer()
+            subprocess.call(command, stdout=devnull, stderr=devnull)
+            elapsed = timer() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure_import(module):
+    paths = [os.path.join(ROOT, 'issues'), os.path.join(ROOT, 'wiki')]
+    script = IMPORT_SCRIPT % (paths, module, HEAVY_MODULES)
+    elapsed, heavy = subprocess.check_output([sys.executable, '-c', script]
+                                             ).split(None, 1)
+    return float(elapsed), heavy.strip()
+
+
+def main(rounds=10):
+    rounds = int(rounds)
+    baseline = measure([sys.executable, '-c', 'pass'], rounds)
+    print '%-20s %8.1f ms' % ('python', baseline * 1000)
+    print '%-20s %8.1f ms' % ('migration-tools',
+                              measure([sys.executable, COMMAND, '--help'],
+                                      rounds) * 1000)
+    for subcommand, module in SUBCOMMANDS:
+        command = [sys.executable, COMMAND] + subcommand.split() + ['--help']
+        elapsed = measure(command, rounds)
+        imported, heavy = measure_import(module)
+        print '%-20s %8.1f ms  import %s %6.1f ms  heavy: %s' \
+            % (subcommand, elapsed * 1000, module, imported * 1000, heavy)
+    return 0
+
+
+if __name__ == '__main__':
+    if '-h' in sys.argv or '--help' in sys.argv:
+        print __doc__
+        sys.exit(1)
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,177 @@
+"""Wiki transformer benchmark: measure transformation performance
+
+Usage: benchmark.py [options] [corpus ...]
+
+Transforms generated corpora and reports throughput, time spent in each
+element class (Line, Header, BlockQuote and Table) and how many instances
+of each class were created. Available corpora are `small` (many small
+pages), `huge` (one huge page), `tables` (table heavy pages) and `code`
+(pages with many code blocks and links). All are run by default.
+
+Use `--profile` to run transformations under cProfile and print the
+most expensive functions.
+"""
+
+import argparse
+import cProfile
+import pstats
+import sys
+from collections import defaultdict
+from timeit import default_timer as timer
+
+from transformer import Line, Header, BlockQuote, Table, Transformer
+
+
+MIXED_LINES = [
+    '= Header =',
+    'Plain text with a [http://robotframework.org link] and !EscapedWord.',
+    'See [WikiWordLink the alias] and [#Some_Section a section].',
+    '[http://wiki.example.googlecode.com/hg/image.png]',
+    '<wiki:toc max_depth="2"/>',
+    ' # enumerated item',
+    '  * bullet item',
+    '|| a table || with two || columns ||',
+    '{{{',
+    'literal code',
+    '}}}',
+    '',
+]
+
+
+def generate_small_pages(scale):
+    return [MIXED_LINES * 2 for _ in range(1000 * scale)]
+
+
+def generate_huge_page(scale):
+    return [MIXED_LINES * 5000 * scale]
+
+
+def generate_table_pages(scale):
+    page = []
+    for table in range(10):
+        page.append('== Table %d ==' % table)
+        page.extend('|| row %d || [http://x.org/%d cell] || more text ||'
+                    % (row, row) for row in range(50))
+        page.append('')
+    return [page for _ in range(100 * scale)]
+
+
+def generate_code_pages(scale):
+    page = []
+    for block in range(50):
+        page.extend(['Code and [WikiWord links] to [http://x.org/%d here].'
+                     % block, '{{{'])
+        page.extend('    code line %d with [brackets] and !Bang' % line
+                    for line in range(10))
+        page.extend(['}}}', ''])
+    return [page for _ in range(200 * scale)]
+
+
+CORPORA = [('small', generate_small_pages),
+           ('huge', generate_huge_page),
+           ('tables', generate_table_pages),
+           ('code', generate_code_pages)]
+
+
+class ElementStatistics(object):
+    """Times and counts calls to element classes while installed."""
+    _classes = [Line, Header, BlockQuote, Table]
+    _methods = ['__init__', 'matches', 'add', '__str__']
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.instances = defaultdict(int)
+        self._originals = []
+
+    def install(self):
+        for cls in self._classes:
+            for name in self._methods:
+                if name in cls.__dict__:
+                    self._originals.append((cls, name, cls.__dict__[name]))
+                    setattr(cls, name, self._wrap(cls, name,
+                                                  cls.__dict__[name]))
+
+    def uninstall(self):
+        for cls, name, method in self._originals:
+            setattr(cls, name, method)
+        self._originals = []
+
+    def _wrap(self, cls, name, method):
+        times = self.times
+        instances = self.instances
+        def wrapper(*args, **kwargs):
+            if name == '__init__':
+                instances[cls.__name__] += 1
+            start = timer()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                times[cls.__name__] += timer() - start
+        return wrapper
+
+
+def transform_corpus(pages, profiler=None):
+    for page in pages:
+        Transformer('Benchmark', profiler=profiler).transform(page)
+
+
+def measure(pages, rounds):
+    best = None
+    for _ in range(rounds):
+        start = timer()
+        transform_corpus(pages)
+        elapsed = timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return max(best, 1e-9)
+
+
+def benchmark_corpus(name, pages, rounds):
+    lines = sum(len(page) for page in pages)
+    elapsed = measure(pages, rounds)
+    print '%s: %d pages, %d lines' % (name, len(pages), lines)
+    print '  %12.0f lines/sec  %10.1f pages/sec' % (lines / elapsed,
+                                                   len(pages) / elapsed)
+    stats = ElementStatistics()
+    stats.install()
+    try:
+        transform_corpus(pages)
+    finally:
+        stats.uninstall()
+    for cls in ElementStatistics._classes:
+        cls = cls.__name__
+        print '  %-12s %8.3f s  %10d instances' % (cls, stats.times[cls],
+                                                   stats.instances[cls])
+
+
+def profile_corpus(name, pages, limit=20):
+    profiler = cProfile.Profile()
+    transform_corpus(pages, profiler)
+    print 'Profile of %s:' % name
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(limit)
+
+
+def main(corpora, scale=1, rounds=3, profile=False):
+    for name, generate in CORPORA:
+        if corpora and name not in corpora:
+            continue
+        pages = generate(scale)
+        if profile:
+            profile_corpus(name, pages)
+        else:
+            benchmark_corpus(name, pages, rounds)
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark Google Code wiki to reStructuredText transformer')
+    parser.add_argument('corpora', nargs='*', metavar='corpus')
+    parser.add_argument('-s', '--scale', dest='scale', type=int, default=1)
+    parser.add_argument('-r', '--rounds', dest='rounds', type=int, default=3)
+    parser.add_argument('-p', '--profile', dest='profile', action='store_true')
+    args = parser.parse_args()
+    unknown = set(args.corpora) - set(name for name, _ in CORPORA)
+    if unknown:
+        parser.error('unknown corpus: %s' % ', '.join(sorted(unknown)))
+
+    sys.exit(main(args.corpora, args.scale, args.rounds, args.profile))
@@ -0,0 +1,151 @@
+"""Helpers for publishing converted wiki pages to a git repository
+
+`FastImport` writes commits to a local git repository through a single
+`git fast-import` stream. `HgHistory` reads revisions of the original
+Google Code wiki from a Mercurial checkout.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+
+class FastImport(object):
+    """Commits files to `repository` through one `git fast-import` process.
+
+    The repository is created if it does not exist. Commits are added on top
+    of `branch`, by default the branch HEAD points to. Like `git fast-import`
+    in general, only refs are updated and not the working tree.
+    """
+
+    def __init__(self, repository, branch=None):
+        if not os.path.isdir(repository):
+            subprocess.check_call(['git', 'init', '--quiet', repository])
+        self._repository = repository
+        self._branch = branch or self._git('symbolic-ref', 'HEAD').strip()
+        self._committer = self._git('var', 'GIT_COMMITTER_IDENT').strip()
+        self._parent = self._branch if self._branch_exists() else None
+        self._process = None
+
+    def _branch_exists(self):
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.call(['git', 'rev-parse', '--verify', '--quiet',
+                                    self._branch], cwd=self._repository,
+                                   stdout=devnull, stderr=devnull) == 0
+
+    def __enter__(self):
+        self._process = subprocess.Popen(['git', 'fast-import', '--quiet'],
+                                         cwd=self._repository,
+                                         stdin=subprocess.PIPE)
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0]:
+            self._abort()
+            return
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise RuntimeError('git fast-import failed with rc %d.'
+                               % self._process.returncode)
+
+    def _abort(self):
+        # Killing prevents fast-import from updating refs with partial data.
+        self._process.kill()
+        self._process.wait()
+        try:
+            self._process.stdin.close()
+        except IOError:
+            pass
+
+    def commit(self, message, files=(), deleted=(), author=None):
+        """Commits `files` given as `(path, content)` pairs.
+
+        `author` is a git ident like `Name <email> 1234567890 +0000` and
+        defaults to the committer.
+        """
+        write = self._process.stdin.write
+        write('commit %s\n' % self._branch)
+        if author:
+            write('author %s\n' % author)
+        write('committer %s\n' % self._committer)
+        self._write_data(message)
+        if self._parent:
+            write('from %s^0\n' % self._parent)
+            self._parent = None
+        for path in deleted:
+            write('D %s\n' % path)
+        for path, content in files:
+            write('M 100644 inline %s\n' % path)
+            self._write_data(content)
+        write('\n')
+
+    def _write_data(self, data):
+        self._process.stdin.write('data %d\n%s\n' % (len(data), data))
+
+    def _git(self, *args):
+        return subprocess.check_output(('git',) + args, cwd=self._repository)
+
+
+class HgHistory(object):
+    """Revisions of a Mercurial repository, oldest first."""
+    _field_separator = '\x1f'
+    _revision_separator = '\x1e'
+    _template = _field_separator.join(
+        ['{node}', '{author}', '{date|hgdate}', '{files}', '{file_dels}',
+         '{desc}']) + _revision_separator
+
+    def __init__(self, repository):
+        self._repository = repository
+
+    def __iter__(self):
+        output = self._hg('log', '--rev', '0:tip', '--template', self._template)
+        for record in output.split(self._revision_separator):
+            if record.strip():
+                yield self._parse_revision(record)
+
+    def _parse_revision(self, record):
+        node, author, date, files, deleted, message \
+            = record.split(self._field_separator, 5)
+        deleted = deleted.split()
+        changed = [f for f in files.split() if f not in deleted]
+        return HgRevision(node, self._format_ident(author, date),
+                          message, changed, deleted)
+
+    def _format_ident(self, author, date):
+        if '<' not in author:
+            author = '%s <%s>' % (author.split('@')[0], author)
+        timestamp, offset = date.split()
+        offset = -int(offset)
+        sign = '-' if offset < 0 else '+'
+        hours, minutes = divmod(abs(offset) // 60, 60)
+        return '%s %s %s%02d%02d' % (author, timestamp, sign, hours, minutes)
+
+    def read(self, revision, paths):
+        """Returns contents of `paths` at `revision` as a dictionary."""
+        if not paths:
+            return {}
+        tempdir = tempfile.mkdtemp()
+        try:
+            self._hg('cat', '--rev', revision.node,
+                     '--output', os.path.join(tempdir, '%p'), *paths)
+            contents = {}
+            for path in paths:
+                with open(os.path.join(tempdir, path), 'rb') as infile:
+                    contents[path] = infile.read()
+            return contents
+        finally:
+            shutil.rmtree(tempdir)
+
+    def _hg(self, *args):
+        return subprocess.check_output(('hg',) + args, cwd=self._repository)
+
+
+class HgRevision(object):
+
+    def __init__(self, node, author, message, changed, deleted):
+        self.node = node
+        self.author = author
+        self.message = message
+        self.changed = changed
+        self.deleted = deleted
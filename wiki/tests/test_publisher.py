@@ -0,0 +1,106 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+from nose.tools import assert_equals
+from publisher import FastImport, HgHistory
+from transformer import publish_wiki
+
+
+class _GitRepositoryTest(object):
+    _identity = {'GIT_AUTHOR_NAME': 'Tester', 'GIT_COMMITTER_NAME': 'Tester',
+                 'GIT_AUTHOR_EMAIL': 'tester@example.com',
+                 'GIT_COMMITTER_EMAIL': 'tester@example.com'}
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.repository = os.path.join(self.tempdir, 'repo')
+        self._orig_environ = os.environ.copy()
+        os.environ.update(self._identity)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+        os.environ.clear()
+        os.environ.update(self._orig_environ)
+
+    def _git(self, *args):
+        return subprocess.check_output(('git',) + args, cwd=self.repository)
+
+
+class TestFastImport(_GitRepositoryTest):
+
+    def test_commits_files_in_one_stream(self):
+        with FastImport(self.repository) as git:
+            git.commit('First', [('a.rst', 'a\n'), ('b.rst', 'b\n')],
+                       author='Some One <some@one.org> 1234567890 +0200')
+            git.commit('Second', [('a.rst', 'changed\n')], ['b.rst'])
+        assert_equals(self._git('log', '--format=%s %an %ad', '--date=raw',
+                                '--skip=1'),
+                      'First Some One 1234567890 +0200\n')
+        assert_equals(self._git('log', '--format=%s %an', '-1'),
+                      'Second Tester\n')
+        assert_equals(self._git('ls-tree', '--name-only', 'HEAD'), 'a.rst\n')
+        assert_equals(self._git('show', 'HEAD:a.rst'), 'changed\n')
+
+    def test_commits_on_top_of_existing_commits(self):
+        subprocess.check_call(['git', 'init', '--quiet', self.repository])
+        self._git('commit', '--quiet', '--allow-empty', '-m', 'Existing')
+        with FastImport(self.repository) as git:
+            git.commit('First', [('a.rst', 'a\n')])
+            git.commit('Second', [('b.rst', 'b\n')])
+        assert_equals(self._git('log', '--format=%s'),
+                      'Second\nFirst\nExisting\n')
+        assert_equals(self._git('ls-tree', '--name-only', 'HEAD'),
+                      'a.rst\nb.rst\n')
+
+    def test_refs_are_not_updated_on_error(self):
+        subprocess.check_call(['git', 'init', '--quiet', self.repository])
+        self._git('commit', '--quiet', '--allow-empty', '-m', 'Existing')
+        try:
+            with FastImport(self.repository) as git:
+                git.commit('Partial', [('a.rst', 'a\n')])
+                raise ValueError('Failure')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('ValueError not raised')
+        assert_equals(self._git('log', '--format=%s'), 'Existing\n')
+
+
+class TestPublishWiki(_GitRepositoryTest):
+
+    def test_pages_and_images_are_published(self):
+        wiki = os.path.join(self.tempdir, 'wiki')
+        os.makedirs(os.path.join(wiki, 'images'))
+        os.makedirs(os.path.join(wiki, 'old'))
+        for path, content in [('UserGuide.wiki', '= Intro =\n'),
+                              ('.hgtags', 'abc tip\n'),
+                              ('notes.txt', 'notes\n'),
+                              ('old/Page.wiki', '= Old =\n'),
+                              ('images/logo.png', '\x89PNG')]:
+            with open(os.path.join(wiki, path), 'wb') as output:
+                output.write(content)
+        publish_wiki(wiki, self.repository)
+        assert_equals(self._git('ls-tree', '-r', '--name-only', 'HEAD'),
+                      'User-Guide.rst\nimages/logo.png\n')
+        assert_equals(self._git('show', 'HEAD:images/logo.png'), '\x89PNG')
+
+
+class TestHgHistory(object):
+
+    def test_parse_revision(self):
+        record = '\x1f'.join(['abc', 'Some One <some@one.org>',
+                              '1234567890 -7200', 'A.wiki B.wiki C.wiki',
+                              'C.wiki', 'Message\n\nwith details'])
+        revision = HgHistory('.')._parse_revision(record)
+        assert_equals(revision.node, 'abc')
+        assert_equals(revision.author,
+                      'Some One <some@one.org> 1234567890 +0200')
+        assert_equals(revision.changed, ['A.wiki', 'B.wiki'])
+        assert_equals(revision.deleted, ['C.wiki'])
+        assert_equals(revision.message, 'Message\n\nwith details')
+
+    def test_author_without_email_brackets(self):
+        assert_equals(HgHistory('.')._format_ident('some@one.org', '0 18000'),
+                      'some <some@one.org> 0 -0500')
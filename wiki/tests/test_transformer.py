@@ -1,5 +1,7 @@
+import cProfile
+
 from nose.tools import assert_equals
-from transformer import Line, Header, BlockQuote, Table, Transformer
+from transformer import Line, Header, BlockQuote, Table, Transformer, WikiIndex
 
 
 class _TransformationTest(object):
@@ -52,6 +54,15 @@ class TestLineTransformation(_TransformationTest):
     def test_single_wiki_word_link(self):
         self._assert_line('[Word Long Alias]', '[[Long Alias|Word]]')
 
+    def test_escaped_wiki_word_in_link_text(self):
+        target = 'http://robotframework.org'
+        self._assert_line('[%s !RobotFramework]' % target,
+                          '`RobotFramework`__', [target])
+
+    def test_wiki_word_link_and_escaped_word_on_same_line(self):
+        self._assert_line('!NotLink and [WikiWord Alias]',
+                          'NotLink and [[Alias|Wiki Word]]')
+
     def test_image_link(self):
         target = 'http://wiki.ex.googlecode.com/hg/img.png'
         self._assert_line('[%s]' % target, '[[%s]]' % 'img.png')
@@ -184,6 +195,21 @@ __ http://to.here
     for actual, expected in zip(output, EXPECTED):
         assert_equals(actual, expected)
 
+def test_headers_separated_by_text():
+    output = Transformer('title').transform(['= A =', 'text', '== B ==', 'more'])
+    assert_equals(output.splitlines()[4:], ['A', '=', 'text', 'B', '-', 'more', ''])
+
+def test_headers_in_a_row():
+    output = Transformer('title').transform(['= A =', '== B ==', 'text'])
+    assert_equals(output.splitlines()[4:], ['A', '=', 'B', '-', 'text', ''])
+
+def test_transform_with_profiler():
+    lines = ['= Header =', 'text with [http://to.here link]']
+    profiler = cProfile.Profile()
+    output = Transformer('title', profiler=profiler).transform(lines)
+    assert_equals(output, Transformer('title').transform(lines))
+    assert profiler.getstats()
+
 class TestLinkListNewLines(object):
 
     def test_new_lines_at_the_end_of_file_stripped(self):
@@ -224,3 +250,69 @@ __ http://to.here
         for actual, expected in zip(output, expected):
             assert_equals(actual, expected)
 
+
+
+class TestWikiIndex(object):
+
+    def setUp(self):
+        self.index = WikiIndex()
+        self.index.add_page('FAQ', ['= General questions =', '', '== Why not? =='])
+        self.index.add_page('UserGuide', ['= Some Section ='])
+        self.index.add_image('images/logo.png')
+
+    def test_page_link(self):
+        self._assert_line('[UserGuide the guide]', '[[the guide|User Guide]]')
+
+    def test_acronyms_in_page_title_are_kept_together(self):
+        self._assert_line('[FAQ questions]', '[[questions|FAQ]]')
+
+    def test_page_link_with_section(self):
+        self._assert_line('[UserGuide#some_section s]',
+                          '[[s|User Guide#some-section]]')
+
+    def test_section_link_uses_header_title(self):
+        self._assert_line('[#general_questions x]', '`x`__',
+                          ['__ `General questions`_'])
+
+    def test_section_link_to_header_followed_by_header(self):
+        self.index.add_page('Page', ['= Intro =', '== Details ==', 'text'])
+        line = Line('[#Intro x]', self.index, 'Page')
+        assert_equals(line.links, ['__ `Intro`_'])
+        assert_equals(self.index.broken, [])
+
+    def test_headers_in_block_quotes_are_not_sections(self):
+        self.index.add_page('Page', ['{{{', '= Code =', '}}}', '= Real ='])
+        assert_equals(self.index._sections['Page'], {'real': 'Real'})
+
+    def test_page_link_with_section_id_normalization(self):
+        self.index.add_page('Page', ['= 2. Why not, Robot? ='])
+        self._assert_line('[Page#2._Why_not,_Robot? s]',
+                          '[[s|Page#why-not-robot]]')
+
+    def test_section_link_with_punctuation(self):
+        self._assert_line('[#Why_not? x]', '`x`__', ['__ `Why not?`_'])
+
+    def test_image_link(self):
+        self._assert_line('[http://wiki.p.googlecode.com/hg/images/logo.png]',
+                          '[[images/logo.png]]')
+
+    def test_broken_links(self):
+        self._assert_line('[MissingPage x]', '[[x|Missing Page]]',
+                          broken=['MissingPage'])
+        self._assert_line('[#Missing_Section x]', '`x`__',
+                          ['__ `Missing Section`_'], broken=['#Missing_Section'])
+        self._assert_line('[UserGuide#Missing x]', '[[x|User Guide]]',
+                          broken=['UserGuide#Missing'])
+        self._assert_line('[http://wiki.p.googlecode.com/hg/missing.png]',
+                          '[[missing.png]]', broken=['missing.png'])
+
+    def test_external_link(self):
+        self._assert_line('[http://robotframework.org x]', '`x`__',
+                          ['__ http://robotframework.org'])
+
+    def _assert_line(self, input, expected, links=[], broken=[]):
+        self.index.broken = []
+        line = Line(input, self.index, 'FAQ')
+        assert_equals(str(line), expected)
+        assert_equals(line.links, links)
+        assert_equals(self.index.broken, [('FAQ', b) for b in broken])
@@ -1,55 +1,121 @@
 """Wiki transformer: transform from Google Code Wiki markup to reStructuredTest
 
 Uasge: transformer.py infile [outfile]
+       transformer.py indir [outdir]
+       transformer.py --git repository [--history] indir
 
 If outfile is not given, transformation is done in-place.
+
+If indir is a directory, all `*.wiki` pages in it are converted to `outdir`
+(default indir) with links resolved against an index of the whole wiki.
+Broken links are reported to the standard error.
+
+With `--git`, converted pages and images are committed to a local git
+repository through one `git fast-import` stream instead. With `--history`,
+revisions of the Mercurial wiki repository `indir` are converted and
+committed first, preserving original authors, dates and messages.
 """
 
+import argparse
 import re
 import os
 import sys
 
 
+IMAGE_EXTENSIONS = ['.png', '.gif', '.jpg', '.jpeg', '.svg', '.bmp', '.ico']
+
+_wiki_word_pattern = '([A-Z][a-z]*)'
+_wiki_word_matcher = re.compile('(%s{1,})' % _wiki_word_pattern)
+_section_id_re = re.compile('[^a-z0-9]+')
+_page_name_word_re = re.compile('[A-Z]+(?![a-z])|[A-Z][a-z]*|[a-z]+|[0-9]+')
+
+
+def wiki_word_to_title(target):
+    """Return title of the page WikiWord `target` refers to or None."""
+    match = _wiki_word_matcher.match(target)
+    if match:
+        return ' '.join(re.findall(_wiki_word_pattern, match.group(1)))
+    return None
+
+
+def section_id(title):
+    """Return id docutils generates for section `title`."""
+    return _section_id_re.sub('-', title.lower()).lstrip('-0123456789') \
+        .rstrip('-')
+
+
+def page_name_to_title(name):
+    """Return title for page `name` keeping acronyms like FAQ together."""
+    return ' '.join(_page_name_word_re.findall(name))
+
+
 class Line(object):
-    _escaped_wiki_word_re = re.compile('!([A-Z])')
-    _link_re = re.compile('\[(\\S*) +(.*?)\]')
-    _wiki_word_pattern = '([A-Z][a-z]*)'
-    _wiki_word_matcher = re.compile('(%s{1,})' % _wiki_word_pattern)
-    _image_link_matcher = re.compile('\[http://wiki\..*?\.googlecode\.com/hg/(.*?)\]')
-    _toc_re = re.compile('<wiki:toc *(max_depth=[\'"](\\d)[\'"])? */>')
-    _enumerated_list_re = re.compile('^ *#')
-
-    def __init__(self, line):
+    _enumerated_list_pattern = r'(?P<enumerated_list>^ *#)'
+    _link_pattern = r'(?P<link>\[(?P<link_target>\S*) +(?P<link_text>.*?)\])'
+    _toc_pattern = r'(?P<toc><wiki:toc *(max_depth=[\'"](?P<toc_depth>\d)[\'"])? */>)'
+    _image_pattern = (r'(?P<image>\[http://wiki\..*?\.googlecode\.com/hg/'
+                      r'(?P<image_path>.*?)\])')
+    _escaped_wiki_word_pattern = r'(?P<escaped_wiki_word>!(?P<escaped_char>[A-Z]))'
+    _inline_re = re.compile('|'.join([_enumerated_list_pattern, _link_pattern,
+                                      _toc_pattern, _image_pattern,
+                                      _escaped_wiki_word_pattern]))
+    _nested_inline_re = re.compile('|'.join([_toc_pattern,
+                                             _escaped_wiki_word_pattern]))
+
+    def __init__(self, line, index=None, page=None):
         self.links = []
+        self._index = index
+        self._page = page
         self._line = self._transform_line(line).rstrip()
 
     def _transform_line(self, orig_line):
-        line = orig_line.rstrip()
-        line = self._link_re.sub(self._transform_link, line)
-        line = self._toc_re.sub(self._transform_toc, line)
-        line = self._image_link_matcher.sub(self._transform_image, line)
-        line = self._enumerated_list_re.sub('  #.', line)
-        return self._escaped_wiki_word_re.sub('\\1', line)
+        return self._inline_re.sub(self._transform_token, orig_line.rstrip())
+
+    def _transform_token(self, match):
+        transformer = getattr(self, '_transform_' + match.lastgroup)
+        return transformer(match)
+
+    def _transform_nested(self, text):
+        return self._nested_inline_re.sub(self._transform_token, text)
 
     def _transform_link(self, match):
-        target = match.group(1)
-        if self._wiki_word_matcher.match(target):
-            wikiword = self._wiki_word_matcher.match(target).group(1)
-            parts = re.findall(self._wiki_word_pattern, wikiword)
-            return '[[%s|%s]]' % (match.group(2), ' '.join(parts))
+        target = match.group('link_target')
+        text = self._transform_nested(match.group('link_text'))
+        page = self._get_wiki_page(target)
+        if page:
+            return '[[%s|%s]]' % (text, page)
         if target.startswith('#'):
-            target = '`%s`_' % target[1:].replace('_', ' ')
+            target = '`%s`_' % self._get_section(target[1:])
         self.links.append('__ %s' % target)
-        return '`%s`__' % match.group(2)
+        return '`%s`__' % text
+
+    def _get_wiki_page(self, target):
+        if self._index:
+            return self._index.resolve_page(target, self._page)
+        return wiki_word_to_title(target)
+
+    def _get_section(self, anchor):
+        if self._index:
+            return self._index.resolve_section(anchor, self._page)
+        return anchor.replace('_', ' ')
 
     def _transform_toc(self, match):
         toc = '.. contents::\n  :local:'
-        if match.group(1):
-            toc += '\n  :depth: %s' % match.group(2)
+        if match.group('toc_depth'):
+            toc += '\n  :depth: %s' % match.group('toc_depth')
         return toc
 
     def _transform_image(self, match):
-        return '[[%s]]' % match.group(1)
+        path = self._transform_nested(match.group('image_path'))
+        if self._index:
+            self._index.resolve_image(path, self._page)
+        return '[[%s]]' % path
+
+    def _transform_enumerated_list(self, match):
+        return '  #.'
+
+    def _transform_escaped_wiki_word(self, match):
+        return match.group('escaped_char')
 
     def __str__(self):
         return self._line
@@ -122,14 +188,17 @@ class Header(object):
 
     def __init__(self):
         self._content = ''
+        self.title = ''
 
     def matches(self, line):
         line = line.strip()
-        return line.startswith('=') and line.endswith('=')
+        return (not self._content and line.startswith('=') and
+                line.endswith('='))
 
     def add(self, line):
         level = line.count('=') / 2
         line = line.strip('= ')
+        self.title = line
         self._content = line + '\n' + len(line) * self._levels[level]
 
     def __str__(self):
@@ -137,26 +206,39 @@ class Header(object):
 
 
 class Transformer(object):
+    _element_classes = (Header, BlockQuote, Table)
+    _element_start_re = re.compile(r'\s*[={]|\|\|')
 
-    def __init__(self, title):
+    def __init__(self, title, index=None, page=None, profiler=None):
         self._links = []
         self._elements = []
         self._current = None
         self._title = title
+        self._index = index
+        self._page = page
+        self._profiler = profiler
 
     def transform(self, lines):
-        for l in lines:
-            if not self._is_ignored_pragma_line(l):
-                self._transform_line(l)
+        if self._profiler:
+            return self._profiler.runcall(self._transform, lines)
+        return self._transform(lines)
+
+    def _transform(self, lines):
+        self._parse(lines)
         self._strip_trailing_new_lines()
         return self._format_title() + self._format_elements() + \
                 '\n' + self._format_links() + '\n'
 
+    def _parse(self, lines):
+        for l in lines:
+            if not self._is_ignored_pragma_line(l):
+                self._transform_line(l)
+
     def _is_ignored_pragma_line(self, line):
         return not self._elements and (line.startswith('#') or not line.strip())
 
     def _transform_line(self, orig_line):
-        line = Line(orig_line)
+        line = Line(orig_line, self._index, self._page)
         self._links.extend(line.links)
         if self._extends_current_element(orig_line):
             self._current.add(str(line))
@@ -167,10 +249,14 @@ class Transformer(object):
         return self._current and self._current.matches(line)
 
     def _next_element(self, line):
-        for elem_class in Header, BlockQuote, Table:
+        self._current = None
+        text = str(line)
+        if not self._element_start_re.match(text):
+            return line
+        for elem_class in self._element_classes:
             elem = elem_class()
-            if elem.matches(str(line)):
-                elem.add(str(line))
+            if elem.matches(text):
+                elem.add(text)
                 self._current = elem
                 return elem
         return line
@@ -188,8 +274,77 @@ class Transformer(object):
         return ''
 
     def _strip_trailing_new_lines(self):
-        while str(self._elements[len(self._elements) - 1]) == '':
-            self._elements.pop(len(self._elements) -1)
+        while self._elements and isinstance(self._elements[-1], Line) \
+                and not str(self._elements[-1]):
+            self._elements.pop()
+
+
+class WikiIndex(object):
+    """Page names, section headers and images of a whole wiki.
+
+    Built once before conversion so that links can be resolved with
+    dictionary lookups. Links that cannot be resolved are collected to
+    `broken` as `(page, target)` tuples.
+    """
+    _section_key_re = re.compile('[\\s_]+')
+
+    def __init__(self):
+        self.broken = []
+        self._titles = {}
+        self._sections = {}
+        self._images = set()
+
+    def add_page(self, name, lines):
+        self._titles[name] = page_name_to_title(name)
+        self._sections[name] = dict((self._section_key(h), h) for h in
+                                    self._get_headers(lines))
+
+    def _get_headers(self, lines):
+        in_block_quote = False
+        for line in lines:
+            stripped = line.strip()
+            if in_block_quote:
+                in_block_quote = not line.startswith('}}}')
+            elif stripped.startswith('{{{'):
+                in_block_quote = True
+            elif stripped.startswith('=') and stripped.endswith('='):
+                header = Header()
+                header.add(str(Line(line)))
+                yield header.title
+
+    def add_image(self, path):
+        self._images.add(path)
+
+    def resolve_page(self, target, page=None):
+        name, _, anchor = target.partition('#')
+        if name in self._titles:
+            if not anchor:
+                return self._titles[name]
+            if not self._has_section(name, anchor):
+                self.broken.append((page, target))
+                return self._titles[name]
+            section = self._sections[name][self._section_key(anchor)]
+            return '%s#%s' % (self._titles[name], section_id(section))
+        title = wiki_word_to_title(target)
+        if title:
+            self.broken.append((page, target))
+        return title
+
+    def resolve_section(self, anchor, page=None):
+        if self._has_section(page, anchor):
+            return self._sections[page][self._section_key(anchor)]
+        self.broken.append((page, '#' + anchor))
+        return anchor.replace('_', ' ')
+
+    def resolve_image(self, path, page=None):
+        if path not in self._images:
+            self.broken.append((page, path))
+
+    def _has_section(self, page, anchor):
+        return self._section_key(anchor) in self._sections.get(page, {})
+
+    def _section_key(self, text):
+        return self._section_key_re.sub(' ', text).strip().lower()
 
 
 def transform(inpath, outpath=None):
@@ -202,8 +357,113 @@ def transform(inpath, outpath=None):
     return 0
 
 
+def transform_wiki(indir, outdir=None):
+    outdir = outdir or indir
+    index, pages, _ = read_wiki(indir)
+    for path, content in convert_pages(index, pages):
+        with open(os.path.join(outdir, path), 'w') as outfile:
+            outfile.write(content)
+    report_broken_links(index)
+    return 0
+
+
+def publish_wiki(indir, repository, history=False):
+    from publisher import FastImport, HgHistory
+    index, pages, images = read_wiki(indir)
+    with FastImport(repository) as git:
+        if history:
+            _publish_history(HgHistory(indir), index, git)
+            del index.broken[:]
+        files = list(convert_pages(index, pages))
+        for path in images:
+            with open(os.path.join(indir, path), 'rb') as image:
+                files.append((path, image.read()))
+        git.commit('Convert wiki to reStructuredText.', files)
+    report_broken_links(index)
+    return 0
+
+
+def _publish_history(hg, index, git):
+    for revision in hg:
+        changed = [p for p in revision.changed if _is_wiki_page(p)]
+        deleted = [p for p in revision.deleted if _is_wiki_page(p)]
+        if not (changed or deleted):
+            continue
+        pages = dict((os.path.splitext(path)[0], content.splitlines(True))
+                     for path, content in hg.read(revision, changed).items())
+        git.commit(revision.message, convert_pages(index, pages),
+                   [_get_output_path(os.path.splitext(p)[0]) for p in deleted],
+                   revision.author)
+
+
+def read_wiki(indir):
+    index = WikiIndex()
+    pages = {}
+    images = []
+    for dirpath, dirnames, filenames in os.walk(indir):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for filename in filenames:
+            if filename.startswith('.'):
+                continue
+            path = os.path.relpath(os.path.join(dirpath, filename), indir)
+            path = path.replace(os.sep, '/')
+            if _is_wiki_page(path):
+                with open(os.path.join(indir, path)) as infile:
+                    pages[path[:-5]] = infile.readlines()
+                index.add_page(path[:-5], pages[path[:-5]])
+            elif _is_image(path):
+                images.append(path)
+                index.add_image(path)
+            else:
+                print >> sys.stderr, 'Ignoring %s' % path
+    return index, pages, images
+
+
+def _is_wiki_page(path):
+    return path.endswith('.wiki') and '/' not in path
+
+
+def _is_image(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def convert_pages(index, pages):
+    for name in sorted(pages):
+        title = page_name_to_title(name)
+        content = Transformer(title, index, name).transform(pages[name])
+        yield _get_output_path(name), content
+
+
+def _get_output_path(name):
+    return page_name_to_title(name).replace(' ', '-') + '.rst'
+
+
+def report_broken_links(index):
+    for page, target in index.broken:
+        print >> sys.stderr, 'Broken link in %s: %s' % (page, target)
+
+
+def add_arguments(parser):
+    parser.add_argument('input', help='wiki page or directory')
+    parser.add_argument('output', nargs='?', default=None,
+                        help='output file or directory, default is input')
+    parser.add_argument('-g', '--git', dest='git', metavar='repository',
+                        help='publish converted pages to git repository')
+    parser.add_argument('--history', dest='history', action='store_true',
+                        help='publish also revision history of Mercurial '
+                        'wiki repository given as input')
+
+
+def run(args):
+    if args.git:
+        return publish_wiki(args.input, args.git, args.history)
+    if os.path.isdir(args.input):
+        return transform_wiki(args.input, args.output)
+    return transform(args.input, args.output)
+
+
 if __name__ == '__main__':
-    if len(sys.argv) == 1 or '-h' in sys.argv or '--help' in sys.argv:
-        print __doc__
-        sys.exit(1)
-    sys.exit(transform(*sys.argv[1:]))
+    parser = argparse.ArgumentParser(
+        description='Transform Google Code wiki pages to reStructuredText')
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))